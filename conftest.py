@@ -0,0 +1 @@
+# Makes the top-level scripts importable when running plain `pytest` from the repo root
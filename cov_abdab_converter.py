@@ -1,11 +1,79 @@
 import io
+import itertools
 import os
 import re
+import tempfile
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from streamlit_utils import styled_download_button, encode_object_for_url
+
+# Translation table equivalent to `re.sub(r"\W", "_", ...)` for ASCII strings
+_CLEANUP_TABLE = {c: ord("_") for c in range(128) if not (chr(c).isalnum() or chr(c) == "_")}
+_NON_WORD_RE = re.compile(r"\W")
+
+
+def _cleanup_header(header):
+    if header.isascii():
+        return header.translate(_CLEANUP_TABLE)
+    return _NON_WORD_RE.sub("_", header)
+
+
+def _build_headers(csv_data, header_columns, cleanup_header=True):
+    if not header_columns:
+        return np.full(len(csv_data), "", dtype=object)
+    for h in header_columns:
+        if csv_data[h].isna().any():
+            raise ValueError(f"Header column `{h}` contains missing values.")
+    columns = [
+        csv_data[h].astype("string[pyarrow]").str.replace(" ", "_", regex=False)
+        for h in header_columns
+    ]
+    headers = columns[0].str.cat(columns[1:], sep="|") if len(columns) > 1 else columns[0]
+    headers = headers.to_numpy(dtype=object)
+    if cleanup_header:
+        headers[:] = [_cleanup_header(h) for h in headers]
+    return headers
+
+
+def _wrap_sequence(seq, max_line_length, line_ending):
+    if not isinstance(seq, str) or len(seq) <= max_line_length:
+        return seq
+    return line_ending.join(
+        [seq[i:i+max_line_length] for i in range(0, len(seq), max_line_length)]
+    )
+
+
+def _build_column_entries(
+    column,
+    sequence_column,
+    headers,
+    row_prefixes,
+    row_number_lengths,
+    line_ending,
+    max_header_length,
+    max_line_length,
+):
+    valid = (column.notna() & ~column.isin(["ND", "TBC"])).to_numpy()
+    rows = np.flatnonzero(valid)
+    seq_bodies = column[valid].map(
+        lambda seq: f"{line_ending}{_wrap_sequence(seq, max_line_length, line_ending)}{line_ending}"
+    ).to_numpy(dtype=object)
+    seq_column_title = sequence_column.replace(' ', '_')
+    base_headers = headers[rows]
+    if max_header_length:
+        max_base_header_lengths = (
+            max_header_length - row_number_lengths[rows] - len(seq_column_title) - 1
+        )
+        if rows.size and max_base_header_lengths.min() < 5:
+            raise ValueError(
+                "`max_header_length` is too low to write meaningful fasta header."
+            )
+        base_headers = np.array(
+            [h[:m] for h, m in zip(base_headers, max_base_header_lengths)], dtype=object
+        )
+    return rows, row_prefixes[rows] + f"{seq_column_title}|" + base_headers + seq_bodies
 
 
 def dataframe_to_fasta_entry(
@@ -18,34 +86,56 @@ def dataframe_to_fasta_entry(
     max_header_length=None,
     max_line_length=58,
 ):
-    for i, row in enumerate(csv_data.to_dict(orient='records')):
-        row_number = str(i) + "|" if add_row_number else ""
-        base_header = "|".join([row[h] for h in header_columns]).replace(" ", "_")
-        if cleanup_header:
-            base_header = re.sub("\W", "_", base_header)
-        for t in sequence_columns:
-            if isinstance(row[t], str):
-                if row[t] not in ["ND", "TBC"]:
-                    seq_column_title = t.replace(' ', '_')
-                    tmp_base_header = base_header
-                    if max_header_length:
-                        max_base_header_length = max_header_length - len(row_number) - len(seq_column_title) - 1
-                        if max_base_header_length < 5:
-                            raise ValueError(
-                                "`max_header_length` is too low to write meaningful fasta header."
-                            )
-                        if len(tmp_base_header) > max_base_header_length:
-                            tmp_base_header = tmp_base_header[:max_base_header_length]
-                    sequence_lines = line_ending.join(
-                        [row[t][i:i+max_line_length] for i in range(0, len(row[t]), max_line_length)]
-                    )
-                    yield f">{row_number}{seq_column_title}|{tmp_base_header}{line_ending}{sequence_lines}{line_ending}"
-
-
-
-def write_entries(csv_data, output_file):
-    for line in dataframe_to_fasta_entry(csv_data):
-        output_file.write(line)
+    headers = _build_headers(csv_data, header_columns, cleanup_header=cleanup_header)
+    # Static fragments are folded into per-row prefixes and per-sequence bodies, so
+    # that each column only needs three array concatenations
+    if add_row_number:
+        row_prefixes = np.array([f">{i}|" for i in range(len(csv_data))], dtype=object)
+    else:
+        row_prefixes = np.full(len(csv_data), ">", dtype=object)
+    row_number_lengths = None
+    if max_header_length:
+        # Length of the "{i}|" row number prefix, without the leading ">"
+        if add_row_number:
+            row_number_lengths = np.char.str_len(np.arange(len(csv_data)).astype(str)) + 1
+        else:
+            row_number_lengths = np.zeros(len(csv_data), dtype=int)
+
+    results = [
+        _build_column_entries(
+            csv_data[t],
+            t,
+            headers=headers,
+            row_prefixes=row_prefixes,
+            row_number_lengths=row_number_lengths,
+            line_ending=line_ending,
+            max_header_length=max_header_length,
+            max_line_length=max_line_length,
+        )
+        for t in sequence_columns
+    ]
+    if not results:
+        return
+    entry_rows, entry_columns = zip(*results)
+
+    # Restore row-major order: all entries of a row, in sequence column order
+    order = np.argsort(np.concatenate(entry_rows), kind="stable")
+    yield from np.concatenate(entry_columns)[order]
+
+
+def write_entries(csv_data, output_file, header_columns, sequence_columns, **kwargs):
+    output_file.writelines(
+        dataframe_to_fasta_entry(csv_data, header_columns, sequence_columns, **kwargs)
+    )
+
+
+@st.cache_data(show_spinner=False)
+def load_csv(csv_source):
+    if isinstance(csv_source, bytes):
+        csv_source = io.BytesIO(csv_source)
+    # The pyarrow engine infers types before any cast (e.g. "007" becomes "7"), so
+    # parse as text with the C engine and store the columns as Arrow strings
+    return pd.read_csv(csv_source, dtype=str).astype("string[pyarrow]")
 
 
 def parse_output_name(filename):
@@ -93,22 +183,27 @@ def main():
     )
 
     if csv_uploaded:
-        csv_data = pd.read_csv(csv_uploaded)
+        csv_data = load_csv(csv_uploaded.getvalue())
         output_name = parse_output_name(csv_uploaded.name)
     else:
-        csv_data = pd.read_csv(csv_url)
+        csv_data = load_csv(csv_url)
         output_name = parse_output_name(csv_url)
+    columns = csv_data.columns.to_list()
+    column_set = set(columns)
+
+    if st.checkbox("Preview CSV (first 500 rows)"):
+        st.dataframe(csv_data.head(500))
 
     header_columns = st.multiselect(
         label="Header columns",
-        options=csv_data.columns.to_list(),
-        default=[n for n in ["Name", "Ab or Nb", "Origin"] if n in csv_data.columns],
+        options=columns,
+        default=[n for n in ["Name", "Ab or Nb", "Origin"] if n in column_set],
         help="Select columns to use in the fasta entry headers."
     )
     sequence_columns = st.multiselect(
         label="Sequence columns",
-        options=csv_data.columns.to_list(),
-        default=[n for n in ["CDRH3", "CDRL3", "VH or VHH", "VL"] if n in csv_data.columns],
+        options=columns,
+        default=[n for n in ["CDRH3", "CDRL3", "VH or VHH", "VL"] if n in column_set],
         help=(
             "Select columns with peptide sequences. Each column will be written as as "
             "separate entry in the fasta file."
@@ -141,18 +236,25 @@ def main():
         status_placeholder = st.empty()
         status_placeholder.info(":hourglass_flowing_sand: Converting...")
 
+        fasta_path = None
         try:
             if max_header_length == 0:
                 max_header_length = None
-            entries = [l for l in dataframe_to_fasta_entry(
+            entry_generator = dataframe_to_fasta_entry(
                 csv_data, header_columns, sequence_columns,
                 add_row_number=add_row_number,
                 cleanup_header=cleanup_header,
                 max_header_length=max_header_length,
-                max_line_length=max_line_length
-            )]
-            entries_top = "".join(entries[:10])
-            entries_b64 = encode_object_for_url("".join(entries))
+                max_line_length=max_line_length,
+            )
+            top_entries = list(itertools.islice(entry_generator, 10))
+            with tempfile.NamedTemporaryFile(
+                mode="w", encoding="utf-8", newline="", suffix=".fasta", delete=False
+            ) as fasta_file:
+                fasta_path = fasta_file.name
+                fasta_file.writelines(top_entries)
+                fasta_file.writelines(entry_generator)
+            entries_top = "".join(top_entries)
 
         except Exception as e:
             status_placeholder.error(":x: Something went wrong.")
@@ -161,19 +263,23 @@ def main():
         else:
             status_placeholder.success(":heavy_check_mark: Finished!")
 
-            st.subheader("Original CSV")
-            st.markdown("Only the first 500 entries are shown.")
-            st.write(csv_data.head(500))
-
             st.subheader("Fasta entries")
             st.markdown("Only the first ten entries are shown.")
             st.code(entries_top, language=None)
 
-            styled_download_button(
-                f'data:file/fasta;base64,{entries_b64}',
-                "Download fasta",
-                download_filename=output_name
-            )
+            # Do not rerun on download, which would clear the results shown above
+            with open(fasta_path, "rb") as f:
+                st.download_button(
+                    "Download fasta",
+                    data=f,
+                    file_name=output_name,
+                    mime="text/x-fasta",
+                    on_click="ignore",
+                )
+
+        finally:
+            if fasta_path:
+                os.remove(fasta_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from cov_abdab_converter import dataframe_to_fasta_entry
+
+
+def test_missing_header_value_raises():
+    csv_data = pd.DataFrame({"Name": ["ab1", None], "VH": ["EVQLV", "QVQLQ"]})
+    with pytest.raises(ValueError, match="Name"):
+        list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH"]))
+
+
+def test_dataframe_to_fasta_entry():
+    csv_data = pd.DataFrame({
+        "Name": ["ab 1", "ab/2"],
+        "VH": ["EVQLVESGGG", "ND"],
+        "VL": [None, "DIQMT"],
+    })
+    entries = list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH", "VL"], max_line_length=4))
+    assert entries == [">0|VH|ab_1\nEVQL\nVESG\nGG\n", ">1|VL|ab_2\nDIQM\nT\n"]
+
+
+def test_dataframe_to_fasta_entry_row_major_order():
+    csv_data = pd.DataFrame({
+        "Name": ["ab1", "ab2"],
+        "CDRH3": ["ARDY", "AKGG"],
+        "VH": ["EVQLV", "QVQLQ"],
+        "VL": ["DIQMT", "TBC"],
+    })
+    entries = list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VL", "CDRH3", "VH"]))
+    assert entries == [
+        ">0|VL|ab1\nDIQMT\n",
+        ">0|CDRH3|ab1\nARDY\n",
+        ">0|VH|ab1\nEVQLV\n",
+        ">1|CDRH3|ab2\nAKGG\n",
+        ">1|VH|ab2\nQVQLQ\n",
+    ]
+
+
+def test_dataframe_to_fasta_entry_max_header_length():
+    csv_data = pd.DataFrame({"Name": ["abcdefghij"], "VH": ["EVQLV"]})
+    entries = list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH"], max_header_length=12))
+    assert entries == [">0|VH|abcdefg\nEVQLV\n"]
+    with pytest.raises(ValueError, match="max_header_length"):
+        list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH"], max_header_length=9))
+
+
+def test_dataframe_to_fasta_entry_without_row_number():
+    csv_data = pd.DataFrame({"Name": ["abcdefghij"], "VH": ["EVQLV"]})
+    entries = list(dataframe_to_fasta_entry(
+        csv_data, ["Name"], ["VH"], add_row_number=False, max_header_length=12
+    ))
+    assert entries == [">VH|abcdefghi\nEVQLV\n"]
+
+
+def test_dataframe_to_fasta_entry_without_header_columns():
+    csv_data = pd.DataFrame({"Name": ["ab1"], "VH": ["EVQLV"]})
+    entries = list(dataframe_to_fasta_entry(csv_data, [], ["VH"]))
+    assert entries == [">0|VH|\nEVQLV\n"]
+
+
+def test_dataframe_to_fasta_entry_cleanup_header():
+    csv_data = pd.DataFrame({"Name": ["ab-1 x", "Llamaé-1 x"], "VH": ["EVQLV", "QVQLQ"]})
+    entries = list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH"]))
+    assert entries == [">0|VH|ab_1_x\nEVQLV\n", ">1|VH|Llamaé_1_x\nQVQLQ\n"]
+    entries = list(dataframe_to_fasta_entry(csv_data, ["Name"], ["VH"], cleanup_header=False))
+    assert entries == [">0|VH|ab-1_x\nEVQLV\n", ">1|VH|Llamaé-1_x\nQVQLQ\n"]